@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set
 from model import ClassifiedHeading
 
 def build_hierarchy(document_title: str, classified_headings: List[ClassifiedHeading]) -> Dict[str, Any]:
@@ -9,24 +9,26 @@ def build_hierarchy(document_title: str, classified_headings: List[ClassifiedHea
     """
     root = {"title": document_title, "outline": []}
     stack: List[Dict] = [root]
-    last_heading_text = None  # Keep track of the last added heading
+    stack_levels: List[int] = [0]  # Levels of the nodes on the stack; 0 is the root
+    seen_texts: Set[str] = set()  # Canonical texts of headings already added
 
     # Map heading_level to integer for hierarchy
     level_map = {"h1": 1, "h2": 2, "h3": 3, "other": 4}
 
     for heading in classified_headings:
-        # DE-DUPLICATION LOGIC: Skip if current heading text is the same as the last one
-        if heading.text == last_heading_text:
+        # DE-DUPLICATION LOGIC: Skip headings whose text was already added anywhere in the document
+        canonical_text = heading.text.casefold().strip()
+        if canonical_text in seen_texts:
             continue
+        seen_texts.add(canonical_text)
 
         # Get integer level from heading_level
         current_level = level_map.get(heading.heading_level, 4)
-        parent_level = stack[-1].get("level_val", 0)
 
         # Pop stack until we find the correct parent level
-        while stack and parent_level >= current_level:
+        while stack_levels[-1] >= current_level:
             stack.pop()
-            parent_level = stack[-1].get("level_val", 0)
+            stack_levels.pop()
 
         correct_parent_node = stack[-1]
         
@@ -35,20 +37,10 @@ def build_hierarchy(document_title: str, classified_headings: List[ClassifiedHea
             "text": heading.text,
             "page": heading.page,
             "outline": [],
-            "level_val": current_level,
         }
         
         correct_parent_node["outline"].append(new_heading_node)
         stack.append(new_heading_node)
-        
-        # Update the last seen heading text
-        last_heading_text = heading.text
+        stack_levels.append(current_level)
 
-    def cleanup_keys(node: Dict):
-        if "level_val" in node:
-            del node["level_val"]
-        for child in node.get("outline", []):
-            cleanup_keys(child)
-    
-    cleanup_keys(root)
     return root
\ No newline at end of file
@@ -1,15 +1,77 @@
 from typing import Optional, List
 from dataclasses import dataclass
-from preprocessing import RichTextBlock
-from rules import calculate_heading_score
-from transformers import AutoTokenizer, AutoModel
+from collections import OrderedDict
+from preprocessing import RichTextBlock, BlockColumns
+from rules import calculate_heading_scores
+from transformers import AutoTokenizer, AutoModel, PreTrainedTokenizerFast
+import numpy as np
 import torch
 import uuid
+import os
 
-# Load BERT model and tokenizer
-TOKENIZER = AutoTokenizer.from_pretrained('./pretrained_models_bert_tiny')
-BERT_MODEL = AutoModel.from_pretrained('./pretrained_models_bert_tiny')
-BERT_MODEL.eval()
+BERT_DIR = './pretrained_models_bert_tiny'
+
+def load_bert():
+    """
+    Loads BERT-tiny in FP32 with torchscript-style tuple outputs, ready for tracing.
+    Dynamic int8 quantization is deliberately not applied: it scales activations per batch tensor,
+    which would make a text's prediction depend on the other texts batched with it.
+    """
+    model = AutoModel.from_pretrained(BERT_DIR, torchscript=True)
+    model.eval()
+    return model
+
+def trace_bert(model):
+    """
+    Traces and freezes the BERT forward pass to remove per-op Python dispatch.
+    The traced module takes (input_ids, attention_mask) positionally and returns a tuple.
+    """
+    dummy_input_ids = torch.ones((1, 8), dtype=torch.long)
+    dummy_attention_mask = torch.ones((1, 8), dtype=torch.long)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, (dummy_input_ids, dummy_attention_mask), strict=False)
+    traced = torch.jit.freeze(traced)
+
+    # Warm up at two sequence lengths so the JIT has profiled both before real inputs arrive
+    with torch.inference_mode():
+        for seq_len in (16, 64):
+            traced(torch.ones((2, seq_len), dtype=torch.long), torch.ones((2, seq_len), dtype=torch.long))
+    return traced
+
+# BERT inference settings; headings are short, so sequences are capped well below 512
+BERT_BATCH_SIZE = 32
+BERT_MAX_LENGTH = 64
+
+# BERT model and tokenizer, loaded on first use by _get_bert
+_TOKENIZER = None
+_BERT_MODEL = None
+
+def _get_bert():
+    """
+    Returns the (tokenizer, model) pair, loading both on first call.
+    Documents that never reach the BERT fallback never pay for loading the model.
+    """
+    global _TOKENIZER, _BERT_MODEL
+    if _BERT_MODEL is None:
+        # BERT-tiny benefits more from intra-op than inter-op parallelism. Intra-op threads are capped
+        # at half the cores, since page extraction uses a process per core and the stages overlap.
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // 2))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Only settable once per process, before any inter-op work has started
+
+        tokenizer = AutoTokenizer.from_pretrained(BERT_DIR, use_fast=True)
+        if not isinstance(tokenizer, PreTrainedTokenizerFast):
+            raise TypeError(f"Expected a fast tokenizer for {BERT_DIR}, got {type(tokenizer).__name__}")
+        tokenizer.model_max_length = BERT_MAX_LENGTH
+        _TOKENIZER = tokenizer
+        _BERT_MODEL = trace_bert(load_bert())
+    return _TOKENIZER, _BERT_MODEL
+
+# Process-wide LRU cache of BERT predictions keyed by block text, shared across documents
+PREDICTION_CACHE_SIZE = 4096
+_PREDICTION_CACHE: "OrderedDict[str, dict]" = OrderedDict()
 
 # Rule-based thresholds
 H1_THRESHOLD = 10
@@ -34,9 +96,13 @@ class CompactDocumentModel:
     """Mock CompactDocumentModel for BERT-based classification."""
     def predict(self, inputs):
         # Mock prediction: Replace with actual model inference
-        with torch.no_grad():
-            outputs = BERT_MODEL(**inputs)
-        logits = outputs.last_hidden_state.mean(dim=1)
+        _, bert_model = _get_bert()
+        with torch.inference_mode():
+            outputs = bert_model(inputs["input_ids"], inputs["attention_mask"])
+        # Mean of last_hidden_state over real tokens only, so padding (and hence batching) can't change a prediction
+        hidden = outputs[0]
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        logits = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
         labels = torch.argmax(logits[:, :3], dim=1)  # 0=title, 1=section-title, 2=other
         orders = torch.argmax(logits[:, 3:10], dim=1)  # Order 0-6
         confidences = torch.softmax(logits[:, :3], dim=1).max(dim=1).values
@@ -62,28 +128,48 @@ class CompactDocumentModel:
             })
         return predictions
 
+def _levels_from_scores(scores: np.ndarray) -> np.ndarray:
+    """Maps rule-based scores to heading levels 1-3, with 0 for blocks below every threshold."""
+    return np.select([scores >= H1_THRESHOLD, scores >= H2_THRESHOLD, scores >= H3_THRESHOLD], [1, 2, 3], 0)
+
 def get_heading_level_rule_based(block: RichTextBlock, body_font_size: float) -> Optional[int]:
     """
     Classifies a text block as H1, H2, H3, or None using the rule-based scoring engine.
     """
-    score = calculate_heading_score(block, body_font_size)
-    if score >= H1_THRESHOLD:
-        return 1
-    elif score >= H2_THRESHOLD:
-        return 2
-    elif score >= H3_THRESHOLD:
-        return 3
-    return None
+    scores = calculate_heading_scores(BlockColumns.from_blocks([block]), body_font_size)
+    return int(_levels_from_scores(scores)[0]) or None
 
 def get_heading_level_bert(blocks: List[RichTextBlock]) -> List[ClassifiedHeading]:
     """
     Classifies blocks using BERT-based CompactDocumentModel.
     Returns detailed ClassifiedHeading objects.
     """
+    tokenizer, _ = _get_bert()
     texts = [block.text for block in blocks]
-    inputs = TOKENIZER(texts, padding=True, truncation=True, return_tensors="pt", max_length=512)
     model = CompactDocumentModel()  # Replace with actual model
-    predictions = model.predict(inputs)
+
+    # Only run BERT on texts not already predicted; headers, footers and boilerplate repeat often
+    uncached_texts = list({text: None for text in texts if text not in _PREDICTION_CACHE})
+
+    # Batch texts of similar length together so each batch pads only to its own longest text
+    uncached_texts.sort(key=len)
+    for start in range(0, len(uncached_texts), BERT_BATCH_SIZE):
+        batch_texts = uncached_texts[start:start + BERT_BATCH_SIZE]
+        inputs = tokenizer(
+            batch_texts, padding="longest", truncation=True, return_tensors="pt", max_length=BERT_MAX_LENGTH
+        )
+        for text, pred in zip(batch_texts, model.predict(inputs)):
+            _PREDICTION_CACHE[text] = pred
+
+    predictions = []
+    for i, text in enumerate(texts):
+        _PREDICTION_CACHE.move_to_end(text)
+        pred = dict(_PREDICTION_CACHE[text])
+        pred["id"] = i + 1  # Ids follow the block's position in the document
+        predictions.append(pred)
+
+    while len(_PREDICTION_CACHE) > PREDICTION_CACHE_SIZE:
+        _PREDICTION_CACHE.popitem(last=False)
     
     headings = []
     for block, pred in zip(blocks, predictions):
@@ -102,33 +188,39 @@ def get_heading_level_bert(blocks: List[RichTextBlock]) -> List[ClassifiedHeadin
             ))
     return headings
 
-def classify_blocks(blocks: List[RichTextBlock], body_font_size: float, use_bert: bool = False) -> List[ClassifiedHeading]:
+def classify_blocks(blocks: List[RichTextBlock], body_font_size: float, use_bert: bool = False,
+                    columns: Optional[BlockColumns] = None) -> List[ClassifiedHeading]:
     """
     Filters and classifies a list of RichTextBlocks into a list of headings.
     Tries rule-based classification first; uses BERT if specified.
+    A precomputed BlockColumns view of blocks can be passed in to avoid rebuilding it.
     """
     classified_headings: List[ClassifiedHeading] = []
     
     if not use_bert:
-        # Rule-based classification
-        for i, block in enumerate(blocks):
-            if block.bbox[2] < 50 or block.bbox[3] > 742:  # Filter headers/footers
-                continue
-            level = get_heading_level_rule_based(block, body_font_size)
-            if level is not None:
-                heading_level = f"h{level}"
-                classified_headings.append(ClassifiedHeading(
-                    id=i + 1,
-                    label="section-title" if level > 1 else "title",
-                    parent_id=0,  # Simplified: Update with linker logic
-                    order=level - 1,
-                    confidence=0.9,  # Placeholder: Rule-based confidence
-                    text=block.text,
-                    gt_text="",  # Placeholder: Update with ground truth
-                    box=block.bbox,
-                    page=block.page_num,
-                    heading_level=heading_level
-                ))
+        # Rule-based classification, scored for all blocks at once
+        if columns is None:
+            columns = BlockColumns.from_blocks(blocks)
+        scores = calculate_heading_scores(columns, body_font_size)
+        levels = _levels_from_scores(scores)
+        # Filter headers/footers
+        levels[(columns.bboxes[:, 2] < 50) | (columns.bboxes[:, 3] > 742)] = 0
+        for i in np.flatnonzero(levels).tolist():
+            block = blocks[i]
+            level = int(levels[i])
+            heading_level = f"h{level}"
+            classified_headings.append(ClassifiedHeading(
+                id=i + 1,
+                label="section-title" if level > 1 else "title",
+                parent_id=0,  # Simplified: Update with linker logic
+                order=level - 1,
+                confidence=0.9,  # Placeholder: Rule-based confidence
+                text=block.text,
+                gt_text="",  # Placeholder: Update with ground truth
+                box=block.bbox,
+                page=block.page_num,
+                heading_level=heading_level
+            ))
     else:
         # BERT-based classification
         headings = get_heading_level_bert(blocks)
@@ -1,16 +1,66 @@
 import pdfplumber
-import pytesseract
+import pypdfium2 as pdfium
+from tesserocr import PyTessBaseAPI, PSM
 from dataclasses import dataclass
-from typing import List, Tuple
-from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import groupby, repeat
 from PIL import Image
-import platform
+import numpy as np
+import multiprocessing
+import os
 import time
 import re
 
-# Set the Tesseract executable path for Windows
-if platform.system() == "Windows":
-    pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+# Render resolution for OCR pages; rendering cost grows quadratically with dpi
+OCR_RESOLUTION = 200
+
+# Per-page cap on Tesseract recognition, in milliseconds
+OCR_TIMEOUT_MS = 2000
+
+# Pages with more characters than this in their text layer are born-digital and skip OCR
+MIN_DIGITAL_CHARS = 50
+
+@lru_cache(maxsize=None)
+def _get_ocr_api(lang: str = 'eng', psm: PSM = PSM.SINGLE_BLOCK) -> PyTessBaseAPI:
+    """
+    Returns a Tesseract API handle for the given language and page segmentation mode.
+    Cached so the language model is loaded once per worker process instead of once per page.
+    """
+    api = PyTessBaseAPI(lang=lang, psm=psm)
+    api.SetVariable('tessedit_do_invert', '0')
+    return api
+
+# Page workers are started with forkserver (spawn where unavailable) rather than fork: extraction
+# runs alongside the classification thread, and forking a multi-threaded process can leave the
+# child holding a lock, such as stdout's, that no thread will ever release.
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+PAGE_WORKERS = os.cpu_count() or 1
+_PAGE_POOL: Optional[ProcessPoolExecutor] = None
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    """
+    Returns the page extraction pool shared by all documents, creating it on first use.
+    Workers persist across documents, so each one starts (and loads Tesseract) only once.
+    """
+    global _PAGE_POOL
+    if _PAGE_POOL is None:
+        _PAGE_POOL = ProcessPoolExecutor(max_workers=PAGE_WORKERS, mp_context=_MP_CONTEXT)
+    return _PAGE_POOL
+
+def _reset_page_pool():
+    """Discards a broken page pool so the next document starts a fresh one."""
+    global _PAGE_POOL
+    if _PAGE_POOL is not None:
+        _PAGE_POOL.shutdown(wait=False, cancel_futures=True)
+        _PAGE_POOL = None
+
+_REPEAT_RE = re.compile(r'(.)\1{2,}')
+_WS_RE = re.compile(r'\s+')
 
 def clean_text(text):
     """
@@ -20,8 +70,8 @@ def clean_text(text):
     Returns:
         Cleaned text string.
     """
-    text = re.sub(r'(.)\1{2,}', r'\1', text)  # Collapse 3+ repeated chars
-    text = re.sub(r'\s+', ' ', text)
+    text = _REPEAT_RE.sub(r'\1', text)  # Collapse 3+ repeated chars
+    text = _WS_RE.sub(' ', text)
     text = text.strip()
     return text
 
@@ -37,46 +87,80 @@ class RichTextBlock:
     page_num: int
     block_id: int
 
+@dataclass
+class BlockColumns:
+    """A column-oriented view of a list of RichTextBlocks, one array per attribute, for vectorized passes."""
+    texts: List[str]
+    bboxes: np.ndarray  # (N, 4) float
+    font_sizes: np.ndarray  # (N,) float
+    is_bold: np.ndarray  # (N,) bool
+    is_italic: np.ndarray  # (N,) bool
+    font_names: List[str]
+    page_nums: np.ndarray  # (N,) int32
+    word_counts: np.ndarray  # (N,) int64, whitespace-separated words per text
+
+    @classmethod
+    def from_blocks(cls, blocks: List[RichTextBlock]) -> "BlockColumns":
+        n = len(blocks)
+        return cls(
+            texts=[b.text for b in blocks],
+            bboxes=np.array([b.bbox for b in blocks], dtype=float).reshape(n, 4),
+            font_sizes=np.fromiter((b.font_size for b in blocks), dtype=float, count=n),
+            is_bold=np.fromiter((b.is_bold for b in blocks), dtype=bool, count=n),
+            is_italic=np.fromiter((b.is_italic for b in blocks), dtype=bool, count=n),
+            font_names=[b.font_name for b in blocks],
+            page_nums=np.fromiter((b.page_num for b in blocks), dtype=np.int32, count=n),
+            word_counts=np.fromiter((len(b.text.split()) for b in blocks), dtype=np.int64, count=n),
+        )
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
 def post_process_blocks(blocks: List[RichTextBlock]) -> List[RichTextBlock]:
     """
     Merges fragmented text blocks on the same line and removes duplicates/substrings.
-    Optimized for speed by minimizing iterations.
+    Line grouping and box merging run as vectorized passes over a BlockColumns view.
     """
+    blocks = [
+        b for b in blocks
+        if isinstance(b, RichTextBlock) and b.text.strip() and b.text != "[EMPTY]"
+    ]
     if not blocks:
         return []
 
-    # Group blocks by page and approximate vertical line
-    line_groups = defaultdict(list)
+    # Group blocks by page and approximate vertical line, numbering groups by first appearance
+    columns = BlockColumns.from_blocks(blocks)
     y_tolerance = 5
+    line_keys = np.stack([columns.page_nums, np.round(columns.bboxes[:, 1] / y_tolerance)], axis=1)
+    _, first_index, group_ids = np.unique(line_keys, axis=0, return_index=True, return_inverse=True)
+    group_rank = np.empty_like(first_index)
+    group_rank[np.argsort(first_index)] = np.arange(len(first_index))
+    group_ids = group_rank[group_ids.ravel()]
 
-    for block in blocks:
-        if not isinstance(block, RichTextBlock) or not block.text.strip() or block.text == "[EMPTY]":
-            continue
-        line_key = (block.page_num, round(block.bbox[1] / y_tolerance))
-        line_groups[line_key].append(block)
+    # Order fragments by line group, then left to right, and find where each group starts
+    order = np.lexsort((columns.bboxes[:, 0], group_ids))
+    starts = np.flatnonzero(np.r_[True, np.diff(group_ids[order]) != 0])
+    ends = np.r_[starts[1:], len(order)]
+
+    # Merged box and dominant (first largest-font) fragment per group
+    bboxes = columns.bboxes[order]
+    x0s = np.minimum.reduceat(bboxes[:, 0], starts).tolist()
+    y0s = np.minimum.reduceat(bboxes[:, 1], starts).tolist()
+    x1s = np.maximum.reduceat(bboxes[:, 2], starts).tolist()
+    y1s = np.maximum.reduceat(bboxes[:, 3], starts).tolist()
+    font_sizes = columns.font_sizes[order]
+    is_max = font_sizes == np.repeat(np.maximum.reduceat(font_sizes, starts), ends - starts)
+    dominant_positions = np.minimum.reduceat(np.where(is_max, np.arange(len(order)), len(order)), starts)
 
     # Merge fragments within each line group
     merged_blocks: List[RichTextBlock] = []
-    for key, group in line_groups.items():
-        if not group:
-            continue
-        
-        group.sort(key=lambda b: b.bbox[0])
-        full_text = " ".join(b.text for b in group if b.text.strip())
-        
-        if not full_text.strip():
-            continue
-            
-        x0 = min(b.bbox[0] for b in group)
-        y0 = min(b.bbox[1] for b in group)
-        x1 = max(b.bbox[2] for b in group)
-        y1 = max(b.bbox[3] for b in group)
-        
-        dominant_block = max(group, key=lambda b: b.font_size)
-        
+    order = order.tolist()
+    for g, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        full_text = " ".join(blocks[i].text for i in order[start:end])
+        dominant_block = blocks[order[dominant_positions[g]]]
         merged_blocks.append(RichTextBlock(
             text=full_text,
-            bbox=(x0, y0, x1, y1),
+            bbox=(x0s[g], y0s[g], x1s[g], y1s[g]),
             font_size=dominant_block.font_size,
             font_name=dominant_block.font_name,
             is_bold=dominant_block.is_bold,
@@ -85,145 +169,241 @@ def post_process_blocks(blocks: List[RichTextBlock]) -> List[RichTextBlock]:
             block_id=dominant_block.block_id
         ))
 
-    # De-duplicate by removing substrings
+    # De-duplicate by removing substrings. Longer texts come first, so each block only needs
+    # checking against texts already kept on its page. Kept texts are joined into one
+    # newline-separated string (cleaned text never contains newlines), turning the check
+    # into a single C-level substring search instead of one per kept text.
     sorted_for_dedup = sorted(merged_blocks, key=lambda b: (b.page_num, -len(b.text)))
     final_blocks: List[RichTextBlock] = []
-    seen_on_page = defaultdict(list)
 
-    for block in sorted_for_dedup:
-        page_seen_texts = seen_on_page[block.page_num]
-        if any(block.text in seen_text for seen_text in page_seen_texts):
-            continue
-        final_blocks.append(block)
-        page_seen_texts.append(block.text)
+    for _, page_blocks in groupby(sorted_for_dedup, key=lambda b: b.page_num):
+        seen_texts = set()
+        page_seen = ""
+        for block in page_blocks:
+            if block.text in seen_texts or block.text in page_seen:
+                continue
+            final_blocks.append(block)
+            seen_texts.add(block.text)
+            page_seen += "\n" + block.text
             
     return sorted(final_blocks, key=lambda b: (b.page_num, b.bbox[1], b.bbox[0]))
 
+# Ligature glyphs expanded to plain letters, as pdfplumber's extract_text_lines does
+_LIGATURES = str.maketrans({"ﬀ": "ff", "ﬃ": "ffi", "ﬄ": "ffl", "ﬁ": "fi", "ﬂ": "fl", "ﬆ": "st", "ﬅ": "st"})
+
+def _group_chars_into_lines(chars: List[dict], x_tolerance: float = 3, y_tolerance: float = 3) -> List[dict]:
+    """
+    Groups pdfplumber chars into text lines in a single pass, replacing page.extract_text_lines.
+    Chars are clustered by top coordinate (within y_tolerance) and read left to right; a space is
+    inserted where the horizontal gap exceeds x_tolerance, and ligatures are expanded.
+    Each line reports its bounding box and the font of its first char, as extract_text_lines does;
+    a line's leading char (e.g. a bold "1.") is what marks it as a heading.
+    """
+    line_groups: List[List[dict]] = []
+    last_top = None
+    for char in sorted(chars, key=lambda c: c["top"]):
+        if last_top is None or char["top"] - last_top > y_tolerance:
+            line_groups.append([])
+        line_groups[-1].append(char)
+        last_top = char["top"]
+
+    lines = []
+    for group in line_groups:
+        group.sort(key=lambda c: c["x0"])
+        # Leading and trailing spaces would stretch the line's box
+        while group and group[-1]["text"].isspace():
+            group.pop()
+        while group and group[0]["text"].isspace():
+            group.pop(0)
+        if not group:
+            continue
+        pieces = [group[0]["text"]]
+        for prev, char in zip(group, group[1:]):
+            if char["x0"] - prev["x1"] > x_tolerance and not prev["text"].isspace() and not char["text"].isspace():
+                pieces.append(" ")
+            pieces.append(char["text"])
+        lines.append({
+            "text": "".join(pieces).translate(_LIGATURES),
+            "x0": min(c["x0"] for c in group),
+            "top": min(c["top"] for c in group),
+            "x1": max(c["x1"] for c in group),
+            "bottom": max(c["bottom"] for c in group),
+            "size": group[0].get("size", 12.0),
+            "fontname": group[0].get("fontname", "Unknown"),
+            "fontweight": group[0].get("fontweight", 400),
+        })
+    return lines
+
+def _extract_page(page, page_idx: int) -> List[RichTextBlock]:
+    """
+    Extracts the blocks of a single open pdfplumber page, using its text layer for digital text and OCR otherwise.
+    Returned blocks carry a placeholder block_id; the caller assigns stable ids.
+    """
+    blocks: List[RichTextBlock] = []
+
+    # Try pdfplumber text extraction. A page with a real text layer is treated as
+    # born-digital even when it has few lines (e.g. a title page), so it never pays for OCR.
+    chars = page.chars
+    is_digital = len(chars) > MIN_DIGITAL_CHARS
+    lines = _group_chars_into_lines(chars)
+    if is_digital or (lines and any(line["text"].strip() for line in lines) and len(lines) >= 5):
+        # Process digital text lines
+        for line in lines:
+            text = clean_text(line["text"])  # Clean extracted text
+            if not text:
+                continue
+            box = [line["x0"], line["top"], line["x1"], line["bottom"]]
+            if any(coord < 0 or coord > max(page.width, page.height) for coord in box):
+                continue
+            font_size = line["size"]
+            font_name = line["fontname"].lower()
+            is_bold = "bold" in font_name or line["fontweight"] >= 700
+            is_italic = "italic" in font_name
+            blocks.append(RichTextBlock(
+                text=text,
+                bbox=tuple(box),
+                font_size=round(font_size, 2),
+                font_name=font_name,
+                is_bold=is_bold,
+                is_italic=is_italic,
+                page_num=page_idx,  # 0-based page numbering
+                block_id=-1
+            ))
+    else:
+        # Fallback to OCR
+        print(f"Page {page_idx} has little or no text layer. Attempting OCR...")
+        try:
+            # Tesseract works on grayscale, so convert before handing the image over
+            pil_img = page.to_image(resolution=OCR_RESOLUTION).original.convert('L')
+            api = _get_ocr_api()
+            api.SetImage(pil_img)
+            # Cap recognition at 2 seconds per page; a page that times out falls through to [EMPTY]
+            if api.Recognize(timeout=OCR_TIMEOUT_MS):
+                ocr_text = api.GetUTF8Text()
+            else:
+                print(f"OCR timed out for page {page_idx}")
+                ocr_text = ""
+            for line in ocr_text.split('\n'):
+                line = line.strip()
+                if not line:
+                    continue
+                line = clean_text(line)  # Clean OCR text
+                if not line:
+                    continue
+                blocks.append(RichTextBlock(
+                    text=line,
+                    bbox=(0, 0, page.width, page.height),
+                    font_size=12.0,
+                    font_name="OCR",
+                    is_bold=False,
+                    is_italic=False,
+                    page_num=page_idx,  # 0-based page numbering
+                    block_id=-1
+                ))
+        except Exception as ocr_error:
+            print(f"OCR fallback failed for page {page_idx}: {ocr_error}")
+
+        if not blocks:
+            blocks.append(RichTextBlock(
+                text="[EMPTY]",
+                bbox=(0, 0, page.width, page.height),
+                font_size=12.0,
+                font_name="OCR",
+                is_bold=False,
+                is_italic=False,
+                page_num=page_idx,  # 0-based page numbering
+                block_id=-1
+            ))
+
+    return blocks
+
+def _extract_pages(pdf_path: str, page_range: range) -> List[List[RichTextBlock]]:
+    """
+    Extracts a contiguous run of pages in a worker process, returning one block list per page.
+    The PDF is opened once per run rather than once per page, and each page is closed as soon
+    as it is done so its parsed objects do not pile up.
+    """
+    results: List[List[RichTextBlock]] = []
+    with pdfplumber.open(pdf_path, pages=[page_idx + 1 for page_idx in page_range]) as pdf:
+        for page_idx, page in zip(page_range, pdf.pages):
+            results.append(_extract_page(page, page_idx))
+            page.close()
+    return results
+
 def extract_rich_text_blocks(pdf_path: str) -> List[RichTextBlock]:
     """
-    Extracts text using pdfplumber for digital text, with OCR fallback when fewer than 5 lines are extracted.
+    Extracts text using pdfplumber for digital text, with OCR fallback for pages with little or no text layer.
+    Pages are independent, so they are extracted in parallel across a process pool.
+    Workers start via forkserver or spawn and re-import the caller's __main__, so scripts calling this
+    must guard their entry point with `if __name__ == "__main__":`.
+    If the pool breaks, the document is extracted in-process instead.
     Cleans text with clean_text function to remove repeated characters and normalize whitespace.
     Uses 0-based page numbering for page_num.
     Outputs RichTextBlock objects for compatibility with rule-based classification.
     """
     start_time = time.time()
     initial_blocks: List[RichTextBlock] = []
-    current_block_id = 0
 
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_idx, page in enumerate(pdf.pages):
-                # Try pdfplumber text extraction
-                lines = list(page.extract_text_lines())
-                if lines and any(line.get("text", "").strip() for line in lines) and len(lines) >= 5:
-                    # Process digital text lines
-                    for line in lines:
-                        text = line.get("text", "").strip()
-                        if not text:
-                            continue
-                        text = clean_text(text)  # Clean extracted text
-                        if not text:
-                            continue
-                        box = [line["x0"], line["top"], line["x1"], line["bottom"]]
-                        if any(coord < 0 or coord > max(page.width, page.height) for coord in box):
-                            continue
-                        char = line.get("chars", [{}])[0]
-                        font_size = char.get("size", 12.0)
-                        font_name = char.get("fontname", "Unknown").lower()
-                        is_bold = "bold" in font_name or char.get("fontweight", 400) >= 700
-                        is_italic = "italic" in font_name
-                        rich_block = RichTextBlock(
-                            text=text,
-                            bbox=tuple(box),
-                            font_size=round(font_size, 2),
-                            font_name=font_name,
-                            is_bold=is_bold,
-                            is_italic=is_italic,
-                            page_num=page_idx,  # 0-based page numbering
-                            block_id=current_block_id
-                        )
-                        initial_blocks.append(rich_block)
-                        current_block_id += 1
-                else:
-                    # Fallback to OCR
-                    print(f"Page {page_idx} has fewer than 5 lines or no text. Attempting OCR...")
-                    try:
-                        pil_img = page.to_image(resolution=300).original
-                        ocr_text = pytesseract.image_to_string(
-                            pil_img, lang='eng', config='--psm 6 -c tessedit_do_invert=0', timeout=2
-                        )
-                        if ocr_text.strip():
-                            for line in ocr_text.split('\n'):
-                                line = line.strip()
-                                if not line:
-                                    continue
-                                line = clean_text(line)  # Clean OCR text
-                                if not line:
-                                    continue
-                                rich_block = RichTextBlock(
-                                    text=line,
-                                    bbox=(0, 0, page.width, page.height),
-                                    font_size=12.0,
-                                    font_name="OCR",
-                                    is_bold=False,
-                                    is_italic=False,
-                                    page_num=page_idx,  # 0-based page numbering
-                                    block_id=current_block_id
-                                )
-                                initial_blocks.append(rich_block)
-                                current_block_id += 1
-                        else:
-                            rich_block = RichTextBlock(
-                                text="[EMPTY]",
-                                bbox=(0, 0, page.width, page.height),
-                                font_size=12.0,
-                                font_name="OCR",
-                                is_bold=False,
-                                is_italic=False,
-                                page_num=page_idx,  # 0-based page numbering
-                                block_id=current_block_id
-                            )
-                            initial_blocks.append(rich_block)
-                            current_block_id += 1
-                    except Exception as ocr_error:
-                        print(f"OCR fallback failed for page {page_idx}: {ocr_error}")
-                        rich_block = RichTextBlock(
-                            text="[EMPTY]",
-                            bbox=(0, 0, page.width, page.height),
-                            font_size=12.0,
-                            font_name="OCR",
-                            is_bold=False,
-                            is_italic=False,
-                            page_num=page_idx,  # 0-based page numbering
-                            block_id=current_block_id
-                        )
-                        initial_blocks.append(rich_block)
-                        current_block_id += 1
+        pdf = pdfium.PdfDocument(pdf_path)
+        n_pages = len(pdf)
+        pdf.close()
     except Exception as e:
-        print(f"Error opening {pdf_path} with pdfplumber: {e}")
+        print(f"Error extracting text from {pdf_path}: {e}")
         return []
 
+    if n_pages:
+        # Processes rather than threads: text extraction and OCR are CPU-bound and hold the GIL
+        # Each worker gets one contiguous run of pages, so it opens the PDF only once
+        chunk_size = -(-n_pages // PAGE_WORKERS)
+        page_ranges = [range(start, min(start + chunk_size, n_pages)) for start in range(0, n_pages, chunk_size)]
+        # Submitting starts the workers; failures there are setup errors, not document errors, so they propagate
+        chunk_results = _get_page_pool().map(_extract_pages, repeat(pdf_path), page_ranges)
+        try:
+            page_results = [page_blocks for chunk in chunk_results for page_blocks in chunk]
+        except BrokenProcessPool as e:
+            # A worker died, e.g. one that failed to start; retry the whole document in this process
+            _reset_page_pool()
+            print(f"Page pool broke while extracting {pdf_path} ({e}); extracting in-process")
+            try:
+                page_results = _extract_pages(pdf_path, range(n_pages))
+            except Exception as e:
+                print(f"Error extracting text from {pdf_path}: {e}")
+                return []
+        except Exception as e:
+            print(f"Error extracting text from {pdf_path}: {e}")
+            return []
+
+        # Assign stable block ids in page order
+        current_block_id = 0
+        for page_blocks in page_results:
+            for block in page_blocks:
+                block.block_id = current_block_id
+                initial_blocks.append(block)
+                current_block_id += 1
+
     # Apply post-processing to clean up all extracted blocks
     final_blocks = post_process_blocks(initial_blocks)
     print(f"Preprocessing {pdf_path} took {time.time() - start_time:.2f} seconds")
     return final_blocks
 
-def get_document_baseline_font_size(blocks: List[RichTextBlock]) -> float:
-    """Calculates the most common font size to establish a baseline for body text."""
+def get_document_baseline_font_size(blocks: List[RichTextBlock], columns: Optional[BlockColumns] = None) -> float:
+    """
+    Calculates the most common font size to establish a baseline for body text.
+    Font sizes carry two decimals, so they are counted as integer hundredths; ties go to the smaller size.
+    A precomputed BlockColumns view of blocks can be passed in to avoid rebuilding it.
+    """
     if not blocks:
         return 12.0
-    
-    font_sizes = [b.font_size for b in blocks if not b.is_bold and len(b.text.split()) < 50]
-    
-    if not font_sizes:
-        font_sizes = [b.font_size for b in blocks]
+    if columns is None:
+        columns = BlockColumns.from_blocks(blocks)
 
-    if not font_sizes:
-        return 12.0
-        
-    most_common_list = Counter(font_sizes).most_common(1)
+    font_sizes = np.round(columns.font_sizes * 100).astype(np.int64)
+    body_sizes = font_sizes[~columns.is_bold & (columns.word_counts < 50)]
     
-    if most_common_list:
-        return most_common_list[0][0]
-    else:
-        return 12.0
\ No newline at end of file
+    if not body_sizes.size:
+        body_sizes = font_sizes
+
+    # np.unique returns sizes in ascending order, so argmax picks the smallest most common size
+    sizes, counts = np.unique(body_sizes, return_counts=True)
+    return float(sizes[counts.argmax()]) / 100.0
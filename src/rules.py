@@ -1,10 +1,14 @@
-from preprocessing import RichTextBlock
+from preprocessing import RichTextBlock, BlockColumns
+import numpy as np
 import re
 
+# Numbered heading prefixes such as "1.", "2.1" or "A."
+_NUM_RE = re.compile(r"^((\d+(\.\d+)*)|([A-Z]\.))\s")
+
 def calculate_heading_score(block: RichTextBlock, body_font_size: float) -> int:
     """
-    Calculates a score indicating the likelihood of a text block being a heading
-    based on a set of weighted, relative visual heuristics.
+    Calculates a score indicating the likelihood of a text block being a heading.
+    Scores a one-block view with calculate_heading_scores, which holds the rules.
 
     Args:
         block: The RichTextBlock to evaluate.
@@ -13,35 +17,43 @@ def calculate_heading_score(block: RichTextBlock, body_font_size: float) -> int:
     Returns:
         An integer score. Higher scores indicate a higher likelihood of being a major heading.
     """
-    score = 0
-    font_size = block.font_size
+    return int(calculate_heading_scores(BlockColumns.from_blocks([block]), body_font_size)[0])
+
+def calculate_heading_scores(columns: BlockColumns, body_font_size: float) -> np.ndarray:
+    """
+    Calculates heading scores for a whole document based on a set of weighted, relative visual heuristics.
+    Each rule is evaluated as a boolean mask over the document's block columns instead of block by block.
+
+    Args:
+        columns: The BlockColumns view of the blocks to evaluate.
+        body_font_size: The baseline body font size for the document.
+
+    Returns:
+        An integer array of scores, aligned with the blocks.
+    """
+    texts = columns.texts
+    font_sizes = columns.font_sizes
+    is_bold = columns.is_bold
+    word_counts = columns.word_counts
+    is_upper = np.array([t.isupper() for t in texts], dtype=bool)
+    is_numbered = np.array([_NUM_RE.match(t) is not None for t in texts], dtype=bool)
+    ends_with_period = np.array([t.endswith('.') for t in texts], dtype=bool)
 
     # Rule 1: Relative Font Size (Primary Indicator) [9, 10]
-    if font_size > 1.8 * body_font_size:
-        score += 5
-    elif 1.3 * body_font_size < font_size <= 1.8 * body_font_size:
-        score += 3
-    elif 1.1 * body_font_size < font_size <= 1.3 * body_font_size:
-        score += 2
-    
+    score = np.select(
+        [font_sizes > 1.8 * body_font_size, font_sizes > 1.3 * body_font_size, font_sizes > 1.1 * body_font_size],
+        [5, 3, 2],
+        0,
+    )
     # Rule 2: Font Weight (Bold is a strong signal) [11]
-    if block.is_bold:
-        score += 3
-
+    score += 3 * is_bold
     # Rule 3: Text Case (All caps is a common heading style) [12]
-    if block.text.isupper() and len(block.text.split()) > 1:
-        score += 2
-
+    score += 2 * (is_upper & (word_counts > 1))
     # Rule 4: Content - Numbering (e.g., "1.", "2.1", "A.") [2]
-    if re.match(r"^((\d+(\.\d+)*)|([A-Z]\.))\s", block.text):
-        score += 5
-
+    score += 5 * is_numbered
     # Rule 5: Content - Brevity (Headings are typically short) [11]
-    if len(block.text.split()) < 10:
-        score += 1
-
+    score += word_counts < 10
     # Rule 6: Content - Syntax (Headings rarely end with a period) [13]
-    if not block.text.endswith('.'):
-        score += 1
-        
-    return score
\ No newline at end of file
+    score += ~ends_with_period
+
+    return score
@@ -1,17 +1,22 @@
 import os
-import json
+import orjson
 import time
+import queue
+import threading
 from pathlib import Path
-from preprocessing import extract_rich_text_blocks, get_document_baseline_font_size
+from preprocessing import RichTextBlock, BlockColumns, extract_rich_text_blocks, get_document_baseline_font_size
 from model import classify_blocks, ClassifiedHeading
 from linker import build_hierarchy
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 # For local development, use relative paths
 INPUT_DIR = "../input"
 OUTPUT_DIR = "../output"
 MODEL_PERF_DIR = "../performance"
 
+# Documents buffered between pipeline stages
+PIPELINE_QUEUE_SIZE = 4
+
 def find_document_title(blocks: List, headings: List[ClassifiedHeading]) -> str:
     """
     Selects the title as the H1 heading with the largest font size from page 0.
@@ -23,10 +28,10 @@ def find_document_title(blocks: List, headings: List[ClassifiedHeading]) -> str:
     # Prefer H1 from page 0 with largest font size
     page_zero_h1 = [h for h in headings if h.heading_level == "h1" and h.page == 0]
     if page_zero_h1:
-        block_map = {b.text: b for b in blocks}
-        valid_h1 = [h for h in page_zero_h1 if h.text in block_map]
+        # Heading ids are 1-based positions in blocks, so each heading maps straight to its block
+        valid_h1 = [h for h in page_zero_h1 if 0 < h.id <= len(blocks)]
         if valid_h1:
-            return max(valid_h1, key=lambda h: block_map[h.text].font_size).text
+            return max(valid_h1, key=lambda h: blocks[h.id - 1].font_size).text
     
     # Fallback: First non-empty block from page 0
     first_page_blocks = [b for b in blocks if b.page_num == 0][:10]
@@ -42,6 +47,13 @@ def find_document_title(blocks: List, headings: List[ClassifiedHeading]) -> str:
     
     return "Untitled Document"
 
+def write_json(obj: Any, output_path: str):
+    """
+    Writes obj as indented UTF-8 JSON using orjson, which serializes in C.
+    """
+    with open(output_path, 'wb') as f:
+        f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+
 def save_flat_output(headings: List[ClassifiedHeading], title: str, output_path: str):
     """
     Saves headings in the flat JSON format with level as H1/H2/H3 and 0-based page numbers.
@@ -57,8 +69,7 @@ def save_flat_output(headings: List[ClassifiedHeading], title: str, output_path:
             for heading in headings
         ]
     }
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=4, ensure_ascii=False)
+    write_json(output, output_path)
 
 def save_hierarchical_output(headings: List[ClassifiedHeading], title: str, output_path: str):
     """
@@ -80,8 +91,7 @@ def save_hierarchical_output(headings: List[ClassifiedHeading], title: str, outp
             if h["text"].strip() and h["text"] != title
         ]
     }
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=4, ensure_ascii=False)
+    write_json(output, output_path)
 
 def save_model_output(headings: List[ClassifiedHeading], output_path: str):
     """
@@ -102,8 +112,78 @@ def save_model_output(headings: List[ClassifiedHeading], output_path: str):
         }
         for heading in headings
     ]
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=4, ensure_ascii=False)
+    write_json(output, output_path)
+
+def preprocess_pdf(file_path: str) -> List[RichTextBlock]:
+    """
+    Preprocessing stage: extracts rich text blocks with visual features from one PDF.
+    """
+    filename = os.path.basename(file_path)
+    print(f"Processing {filename}...")
+    preprocess_start = time.time()
+    rich_text_blocks = extract_rich_text_blocks(file_path)
+    preprocess_time = time.time() - preprocess_start
+    print(f"Preprocessing {filename} took {preprocess_time:.2f} seconds")
+    return rich_text_blocks
+
+def classify_pdf(file_path: str, rich_text_blocks: List[RichTextBlock]) -> Tuple[str, List[ClassifiedHeading], Optional[List[ClassifiedHeading]]]:
+    """
+    Classification stage: tries rule-based classification and falls back to BERT if insufficient headings.
+    Returns the document title, the final headings, and the BERT headings (None if BERT was not used).
+    """
+    filename = os.path.basename(file_path)
+
+    # Column view shared by the vectorized analysis passes
+    columns = BlockColumns.from_blocks(rich_text_blocks)
+
+    # Analysis: Determine baseline font
+    baseline_font_size = get_document_baseline_font_size(rich_text_blocks, columns)
+    
+    # Classification: Try rule-based first
+    rule_based_headings = classify_blocks(rich_text_blocks, baseline_font_size, use_bert=False, columns=columns)
+    
+    # Fallback to BERT if rule-based yields insufficient headings
+    page_count = int(columns.page_nums.max()) + 1
+    min_headings = max(3, page_count)  # Expect at least 3 or 1 per page
+    final_headings = rule_based_headings
+    bert_headings = None
+    if len(rule_based_headings) < min_headings:
+        print(f"Rule-based classification yielded {len(rule_based_headings)} headings for {filename}. Falling back to BERT...")
+        bert_headings = classify_blocks(rich_text_blocks, baseline_font_size, use_bert=True)
+        final_headings = bert_headings
+    
+    # Find document title
+    doc_title = find_document_title(rich_text_blocks, final_headings)
+    return doc_title, final_headings, bert_headings
+
+def save_outputs(file_path: str, doc_title: str, final_headings: List[ClassifiedHeading], bert_headings: Optional[List[ClassifiedHeading]]):
+    """
+    Output stage: saves the flat, hierarchical and (if BERT was used) detailed model outputs for one PDF.
+    """
+    # Define output paths
+    output_filename = Path(file_path).stem + ".json"
+    hierarchical_output_filename = Path(file_path).stem + "_hierarchical_output.json"
+    model_output_filename = Path(file_path).stem + "_model_output.json"
+    flat_output_path = os.path.join(OUTPUT_DIR, output_filename)
+    hierarchical_output_path = os.path.join(MODEL_PERF_DIR, hierarchical_output_filename)
+    model_output_path = os.path.join(MODEL_PERF_DIR, model_output_filename)
+
+    # Ensure output directories exist
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(MODEL_PERF_DIR, exist_ok=True)
+    
+    # Save flat output (rule-based or BERT)
+    save_flat_output(final_headings, doc_title, flat_output_path)
+    print(f"Saved flat output to {flat_output_path}")
+    
+    # Save hierarchical output (rule-based or BERT)
+    save_hierarchical_output(final_headings, doc_title, hierarchical_output_path)
+    print(f"Saved hierarchical output to {hierarchical_output_path}")
+    
+    # Save detailed BERT model output
+    if bert_headings is not None:
+        save_model_output(bert_headings, model_output_path)
+        print(f"Saved BERT model output to {model_output_path}")
 
 def process_single_pdf(file_path: str):
     """
@@ -113,63 +193,15 @@ def process_single_pdf(file_path: str):
     """
     start_time = time.time()
     filename = os.path.basename(file_path)
-    print(f"Processing {filename}...")
 
     try:
-        # Preprocessing: Extract rich text blocks with visual features
-        processing_path = file_path
-        preprocess_start = time.time()
-        rich_text_blocks = extract_rich_text_blocks(processing_path)
-        preprocess_time = time.time() - preprocess_start
-        print(f"Preprocessing {filename} took {preprocess_time:.2f} seconds")
-        
+        rich_text_blocks = preprocess_pdf(file_path)
         if not rich_text_blocks:
             print(f"Could not extract any text blocks from {filename}. Skipping.")
             return
 
-        # Analysis: Determine baseline font
-        baseline_font_size = get_document_baseline_font_size(rich_text_blocks)
-        
-        # Classification: Try rule-based first
-        rule_based_headings = classify_blocks(rich_text_blocks, baseline_font_size, use_bert=False)
-        
-        # Fallback to BERT if rule-based yields insufficient headings
-        page_count = max(b.page_num for b in rich_text_blocks) + 1
-        min_headings = max(3, page_count)  # Expect at least 3 or 1 per page
-        final_headings = rule_based_headings
-        bert_headings = None
-        if len(rule_based_headings) < min_headings:
-            print(f"Rule-based classification yielded {len(rule_based_headings)} headings for {filename}. Falling back to BERT...")
-            bert_headings = classify_blocks(rich_text_blocks, baseline_font_size, use_bert=True)
-            final_headings = bert_headings
-        
-        # Find document title
-        doc_title = find_document_title(rich_text_blocks, final_headings)
-        
-        # Define output paths
-        output_filename = Path(file_path).stem + ".json"
-        hierarchical_output_filename = Path(file_path).stem + "_hierarchical_output.json"
-        model_output_filename = Path(file_path).stem + "_model_output.json"
-        flat_output_path = os.path.join(OUTPUT_DIR, output_filename)
-        hierarchical_output_path = os.path.join(MODEL_PERF_DIR, hierarchical_output_filename)
-        model_output_path = os.path.join(MODEL_PERF_DIR, model_output_filename)
-
-        # Ensure output directories exist
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        os.makedirs(MODEL_PERF_DIR, exist_ok=True)
-        
-        # Save flat output (rule-based or BERT)
-        save_flat_output(final_headings, doc_title, flat_output_path)
-        print(f"Saved flat output to {flat_output_path}")
-        
-        # Save hierarchical output (rule-based or BERT)
-        save_hierarchical_output(final_headings, doc_title, hierarchical_output_path)
-        print(f"Saved hierarchical output to {hierarchical_output_path}")
-        
-        # Save detailed BERT model output
-        if bert_headings is not None:
-            save_model_output(bert_headings, model_output_path)
-            print(f"Saved BERT model output to {model_output_path}")
+        doc_title, final_headings, bert_headings = classify_pdf(file_path, rich_text_blocks)
+        save_outputs(file_path, doc_title, final_headings, bert_headings)
         
         end_time = time.time()
         print(f"Finished {filename} in {end_time - start_time:.2f} seconds")
@@ -177,6 +209,63 @@ def process_single_pdf(file_path: str):
     except Exception as e:
         print(f"An error occurred while processing {filename}: {e}")
 
+def process_pdfs_pipelined(pdf_paths: List[str]):
+    """
+    Runs preprocessing, classification and output writing for many PDFs as three concurrent stages.
+    Each stage runs in its own thread and hands documents to the next through a bounded queue,
+    so one PDF is being written while the next is classified and the one after is extracted.
+    A None item marks the end of the stream.
+    """
+    extracted: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    classified: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    def preprocess_worker():
+        for file_path in pdf_paths:
+            start_time = time.time()
+            filename = os.path.basename(file_path)
+            try:
+                rich_text_blocks = preprocess_pdf(file_path)
+            except Exception as e:
+                print(f"An error occurred while processing {filename}: {e}")
+                continue
+            if not rich_text_blocks:
+                print(f"Could not extract any text blocks from {filename}. Skipping.")
+                continue
+            extracted.put((file_path, start_time, rich_text_blocks))
+        extracted.put(None)
+
+    def classify_worker():
+        while (item := extracted.get()) is not None:
+            file_path, start_time, rich_text_blocks = item
+            try:
+                doc_title, final_headings, bert_headings = classify_pdf(file_path, rich_text_blocks)
+            except Exception as e:
+                print(f"An error occurred while processing {os.path.basename(file_path)}: {e}")
+                continue
+            classified.put((file_path, start_time, doc_title, final_headings, bert_headings))
+        classified.put(None)
+
+    def output_worker():
+        while (item := classified.get()) is not None:
+            file_path, start_time, doc_title, final_headings, bert_headings = item
+            filename = os.path.basename(file_path)
+            try:
+                save_outputs(file_path, doc_title, final_headings, bert_headings)
+            except Exception as e:
+                print(f"An error occurred while processing {filename}: {e}")
+                continue
+            print(f"Finished {filename} in {time.time() - start_time:.2f} seconds")
+
+    workers = [
+        threading.Thread(target=preprocess_worker, name="preprocess"),
+        threading.Thread(target=classify_worker, name="classify"),
+        threading.Thread(target=output_worker, name="output"),
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
 if __name__ == "__main__":
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
@@ -190,6 +279,4 @@ if __name__ == "__main__":
     if not pdf_files:
         print(f"No PDF files found in {INPUT_DIR}.")
     else:
-        for filename in pdf_files:
-            full_path = os.path.join(INPUT_DIR, filename)
-            process_single_pdf(full_path)
\ No newline at end of file
+        process_pdfs_pipelined([os.path.join(INPUT_DIR, filename) for filename in pdf_files])